@@ -10,8 +10,21 @@ bl_info = {
     "category": "Animation",
 }
 
+import fnmatch
+import hashlib
+import json
+import math
+import re
+import time
+from array import array
+from datetime import datetime
+
 import bpy
-from mathutils import Matrix
+import numpy as np
+from bpy.app.handlers import persistent
+from bpy_extras.io_utils import ExportHelper
+from mathutils import Euler, Matrix, Quaternion, Vector
+from mathutils.bvhtree import BVHTree
 
 # Global properties for toggles in the panel
 def update_follow_rotation(self, context):
@@ -62,6 +75,141 @@ bpy.types.Scene.tweak_pose_set_inverse = bpy.props.BoolProperty(
 bpy.types.Scene.is_update_prepared = bpy.props.BoolProperty(default=False)
 bpy.types.Scene.temp_target_empty_name = bpy.props.StringProperty()
 
+bpy.types.Scene.bone_tool_ground_snap = bpy.props.BoolProperty(
+    name="Snap to Ground",
+    description="Place snap empties on the surface of the ground collection",
+    default=False
+)
+
+bpy.types.Scene.bone_tool_ground_collection = bpy.props.PointerProperty(
+    name="Ground",
+    description="Collection whose meshes are used as ground for snapping",
+    type=bpy.types.Collection
+)
+
+bpy.types.Scene.bone_tool_ground_offset = bpy.props.FloatProperty(
+    name="Ground Offset",
+    description="Distance kept between the ground surface and the snap empty",
+    default=0.0,
+    subtype='DISTANCE'
+)
+
+bpy.types.Scene.bone_tool_ground_search = bpy.props.FloatProperty(
+    name="Search Distance",
+    description="How far above and below the bone the ground is searched",
+    default=1.0,
+    min=0.001,
+    subtype='DISTANCE'
+)
+
+bpy.types.Scene.bone_tool_ground_align_normal = bpy.props.BoolProperty(
+    name="Align to Normal",
+    description="Tilt the snap empty so its up axis follows the ground normal",
+    default=True
+)
+
+bpy.types.Scene.bone_tool_marker_mode = bpy.props.EnumProperty(
+    name="Marker Pairs",
+    description="How timeline markers are paired into snap segments",
+    items=[
+        ('NAME', "By Name", "Pair 'snap' and 'unsnap' markers, 'snap:<bone>' limits a pair to one bone"),
+        ('SELECTED', "Selected", "Pair the selected markers in frame order"),
+    ],
+    default='NAME'
+)
+
+bpy.types.Scene.bone_tool_bone_map_preset = bpy.props.EnumProperty(
+    name="Bone Map",
+    description="How source bone names are matched to target bone names",
+    items=[
+        ('EXACT', "Exact Names", "Bones must have identical names"),
+        ('NORMALIZED', "Normalized", "Ignore case, separators, name prefixes and the Left/.L/_L side notation"),
+        ('MIXAMO_TO_RIGIFY', "Mixamo → Rigify", "Map Mixamo bones to Rigify controls"),
+        ('RIGIFY_TO_MIXAMO', "Rigify → Mixamo", "Map Rigify controls to Mixamo bones"),
+        ('TEXT', "Text Block", "Use 'source = target' lines from a text block"),
+    ],
+    default='NORMALIZED'
+)
+
+bpy.types.Scene.bone_tool_bone_map_text = bpy.props.PointerProperty(
+    name="Bone Map Text",
+    description="Text block with one 'source = target' bone pair per line",
+    type=bpy.types.Text
+)
+
+bpy.types.Scene.bone_tool_stream_window = bpy.props.IntProperty(
+    name="Window Size",
+    description="Number of frames processed at once by Stream Cleanup",
+    default=256,
+    min=16,
+    max=4096
+)
+
+bpy.types.Scene.bone_tool_contact_height = bpy.props.FloatProperty(
+    name="Contact Height",
+    description="Bones below this world height can be in contact with the ground",
+    default=0.05,
+    subtype='DISTANCE'
+)
+
+bpy.types.Scene.bone_tool_contact_speed = bpy.props.FloatProperty(
+    name="Contact Speed",
+    description="Bones moving less than this distance per frame can be in contact with the ground",
+    default=0.01,
+    min=0.0,
+    subtype='DISTANCE'
+)
+
+bpy.types.Scene.bonesnap_stream_fps = bpy.props.FloatProperty(
+    name="Stream Throughput",
+    description="Frames per second reached by the last Stream Cleanup",
+    default=0.0
+)
+
+bpy.types.Scene.bone_tool_profile_samples = bpy.props.IntProperty(
+    name="Profile Samples",
+    description="Number of frames of the scene range timed by the profiler",
+    default=24,
+    min=2,
+    max=500
+)
+
+bpy.types.Scene.bone_tool_group_collection = bpy.props.PointerProperty(
+    name="Group",
+    description="Collection whose armatures are processed by the group operations",
+    type=bpy.types.Collection
+)
+
+bpy.types.Scene.bone_tool_group_bone_filter = bpy.props.StringProperty(
+    name="Bone Filter",
+    description="Comma separated bone name patterns used by the group operations, e.g. '*foot*, *toe*'",
+    default="*foot*"
+)
+
+# Bake cache: fingerprint of the state the last bake left behind, stored per armature
+bpy.types.Object.bonesnap_bake_hash = bpy.props.StringProperty(
+    name="Bake Fingerprint",
+    description="Fingerprint of everything that can affect the bake, taken after the last Bake"
+)
+
+bpy.types.Object.bonesnap_baked_action = bpy.props.PointerProperty(
+    name="Baked Action",
+    description="Action produced by the last Bake of this armature",
+    type=bpy.types.Action
+)
+
+bpy.types.Scene.bonesnap_bake_cache_hits = bpy.props.IntProperty(
+    name="Bake Cache Hits",
+    description="Number of bakes skipped because nothing relevant changed",
+    default=0
+)
+
+bpy.types.Scene.bonesnap_bake_cache_misses = bpy.props.IntProperty(
+    name="Bake Cache Misses",
+    description="Number of bakes that had to evaluate the frame range",
+    default=0
+)
+
 # Define operators
 class POSE_OT_add_empty_to_bone(bpy.types.Operator):
     """Add Empty Arrow to selected bone position with optional rotation and add constraints"""
@@ -122,6 +270,12 @@ class POSE_OT_add_empty_to_bone(bpy.types.Operator):
                     new_empty.matrix_world = Matrix.Translation(bone_matrix_world.translation) @ rotation_matrix
                 # If not following rotation, the empty will keep its default orientation
                 
+                # Optionally drop the empty onto the ground collection
+                ground_matrices, ground_hits = ground_snap_matrices(
+                    context, [Matrix.LocRotScale(new_empty.location, new_empty.rotation_euler, None)])
+                if ground_hits:
+                    new_empty.matrix_world = ground_matrices[0]
+                
                 # Set the display size
                 new_empty.empty_display_size = 0.15
                 new_empty.name = "SnapEmpty"
@@ -669,6 +823,1526 @@ class POSE_OT_tweak_pose(bpy.types.Operator):
                 print("Could not return to Pose mode after error in tweak_pose.")
             return {'CANCELLED'}
 
+# GROUND CONTACT ---------------------------------------------------------------------
+
+# BVH trees keyed by collection name, dropped by _invalidate_ground_bvh when the geometry changes
+_ground_bvh_cache = {}
+
+def _build_ground_bvh(depsgraph, collection):
+    vertices = []
+    triangles = []
+    offset = 0
+    for obj in collection.all_objects:
+        if obj.type not in {'MESH', 'CURVE', 'SURFACE', 'FONT', 'META'}:
+            continue
+        obj_eval = obj.evaluated_get(depsgraph)
+        mesh = obj_eval.to_mesh()
+        try:
+            mesh.calc_loop_triangles()
+            co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+            mesh.vertices.foreach_get("co", co)
+            tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+            mesh.loop_triangles.foreach_get("vertices", tris)
+            matrix_world = np.array(obj_eval.matrix_world)
+            co = co.reshape(-1, 3) @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+            vertices.append(co)
+            triangles.append(tris.reshape(-1, 3) + offset)
+            offset += len(co)
+        finally:
+            obj_eval.to_mesh_clear()
+    if not vertices:
+        return None
+    return BVHTree.FromPolygons(np.concatenate(vertices).tolist(),
+                                np.concatenate(triangles).tolist(),
+                                all_triangles=True)
+
+def get_ground_bvh(context, collection):
+    """Return the cached BVH tree of a ground collection, building it on first use."""
+    members = tuple(sorted(obj.name for obj in collection.all_objects))
+    cached = _ground_bvh_cache.get(collection.name)
+    if cached and cached[0] == members:
+        return cached[1]
+    bvh = _build_ground_bvh(context.evaluated_depsgraph_get(), collection)
+    _ground_bvh_cache[collection.name] = (members, bvh)
+    return bvh
+
+@persistent
+def _invalidate_ground_bvh(scene, depsgraph):
+    # Frame changes do not run this handler, animated ground is not tracked
+    if not _ground_bvh_cache:
+        return
+    for update in depsgraph.updates:
+        if not (update.is_updated_geometry or update.is_updated_transform):
+            continue
+        if not isinstance(update.id, bpy.types.Object):
+            continue
+        name = update.id.original.name
+        for collection_name in list(_ground_bvh_cache):
+            if name in _ground_bvh_cache[collection_name][0]:
+                del _ground_bvh_cache[collection_name]
+
+@persistent
+def _clear_ground_bvh(*args):
+    _ground_bvh_cache.clear()
+
+def project_to_ground(bvh, matrices, offset, search, align):
+    """Drop world matrices straight down onto the BVH surface.
+
+    Returns the new matrices and the number of hits, misses keep their matrix.
+    """
+    up = Vector((0.0, 0.0, 1.0))
+    down = -up
+    projected = []
+    hits = 0
+    for matrix in matrices:
+        location, hit_normal, _index, _distance = bvh.ray_cast(matrix.to_translation() + up * search, down, search * 2.0)
+        if location is None:
+            projected.append(matrix)
+            continue
+        hits += 1
+        normal = hit_normal if hit_normal.dot(up) >= 0.0 else -hit_normal
+        rotation = matrix.to_3x3()
+        if align:
+            rotation = up.rotation_difference(normal).to_matrix() @ rotation
+        projected.append(Matrix.Translation(location + normal * offset) @ rotation.to_4x4())
+    return projected, hits
+
+def ground_snap_matrices(context, matrices):
+    """Apply the scene's ground snap settings to a batch of world matrices."""
+    scene = context.scene
+    if not scene.bone_tool_ground_snap or not scene.bone_tool_ground_collection:
+        return matrices, 0
+    bvh = get_ground_bvh(context, scene.bone_tool_ground_collection)
+    if bvh is None:
+        return matrices, 0
+    return project_to_ground(bvh, matrices,
+                             scene.bone_tool_ground_offset,
+                             scene.bone_tool_ground_search,
+                             scene.bone_tool_ground_align_normal)
+
+def _empty_rotation_prop(empty):
+    return {'QUATERNION': 'rotation_quaternion',
+            'AXIS_ANGLE': 'rotation_axis_angle'}.get(empty.rotation_mode, 'rotation_euler')
+
+def _set_empty_rotation(empty, quaternion):
+    """Write a rotation into the channel the empty uses, return that channel's name."""
+    rotation_prop = _empty_rotation_prop(empty)
+    if rotation_prop == 'rotation_quaternion':
+        quaternion = quaternion.copy()
+        quaternion.make_compatible(empty.rotation_quaternion)
+        empty.rotation_quaternion = quaternion
+    elif rotation_prop == 'rotation_axis_angle':
+        axis, angle = quaternion.to_axis_angle()
+        empty.rotation_axis_angle = (angle, *axis)
+    else:
+        empty.rotation_euler = quaternion.to_euler(empty.rotation_mode, empty.rotation_euler)
+    return rotation_prop
+
+def _empty_matrix_at(empty, frame):
+    """World matrix of an empty at frame, read from its F-curves without changing frame."""
+    rotation_prop = _empty_rotation_prop(empty)
+    channels = {
+        "location": list(empty.location),
+        rotation_prop: list(getattr(empty, rotation_prop)),
+        "scale": list(empty.scale),
+    }
+    anim = empty.animation_data
+    if anim and anim.action:
+        for fc in anim.action.fcurves:
+            values = channels.get(fc.data_path)
+            if values is not None and not fc.mute:
+                values[fc.array_index] = fc.evaluate(frame)
+    rotation = channels[rotation_prop]
+    if rotation_prop == 'rotation_quaternion':
+        rotation = Quaternion(rotation).normalized()
+    elif rotation_prop == 'rotation_axis_angle':
+        rotation = Quaternion(Vector(rotation[1:]), rotation[0])
+    else:
+        rotation = Euler(rotation, empty.rotation_mode)
+    matrix = Matrix.LocRotScale(Vector(channels["location"]), rotation, Vector(channels["scale"]))
+    if empty.parent:
+        matrix = empty.parent.matrix_world @ empty.matrix_parent_inverse @ matrix
+    return matrix
+
+def _snap_empties(arm_obj):
+    """Return the snap empties used by snapLoc/snapRot constraints of an armature."""
+    empties = {}
+    for pb in arm_obj.pose.bones:
+        for c in pb.constraints:
+            if c.name.startswith(("snapLoc:", "snapRot:")) and c.target and c.target.type == 'EMPTY':
+                empties[c.target.name] = c.target
+    return list(empties.values())
+
+class POSE_OT_ground_snap_empties(bpy.types.Operator):
+    """Place every snap empty of the armature on the ground at all of its contact frames"""
+    bl_idname = "pose.ground_snap_empties"
+    bl_label = "Snap Empties to Ground"
+    bl_description = "Raycast all snap empties onto the ground collection at their keyed contact frames"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return (context.mode == 'POSE' and 
+                context.active_object and 
+                context.active_object.type == 'ARMATURE' and
+                context.scene.bone_tool_ground_collection)
+
+    def execute(self, context):
+        try:
+            scene = context.scene
+            bvh = get_ground_bvh(context, scene.bone_tool_ground_collection)
+            if bvh is None:
+                self.report({'WARNING'}, f"No geometry found in '{scene.bone_tool_ground_collection.name}'.")
+                return {'CANCELLED'}
+
+            # Collect one query per empty and contact frame, static empties get a single query
+            queries = []
+            for empty in _snap_empties(context.active_object):
+                anim = empty.animation_data
+                frames = set()
+                if anim and anim.action:
+                    for fc in anim.action.fcurves:
+                        if fc.data_path == "location":
+                            frames.update(kp.co[0] for kp in fc.keyframe_points)
+                if frames:
+                    queries.extend((empty, frame, _empty_matrix_at(empty, frame)) for frame in sorted(frames))
+                else:
+                    queries.append((empty, None, empty.matrix_world.copy()))
+
+            if not queries:
+                self.report({'WARNING'}, "No snap empties found on this armature.")
+                return {'CANCELLED'}
+
+            projected, hits = project_to_ground(bvh, [q[2] for q in queries],
+                                                scene.bone_tool_ground_offset,
+                                                scene.bone_tool_ground_search,
+                                                scene.bone_tool_ground_align_normal)
+
+            for (empty, frame, original), matrix in zip(queries, projected):
+                if matrix is original:
+                    continue
+                if frame is None:
+                    empty.matrix_world = matrix
+                    continue
+                if empty.parent:
+                    matrix = (empty.parent.matrix_world @ empty.matrix_parent_inverse).inverted() @ matrix
+                location, rotation, _scale = matrix.decompose()
+                empty.location = location
+                # Key the rotation channel the empty actually uses
+                rotation_prop = _set_empty_rotation(empty, rotation)
+                empty.keyframe_insert(data_path="location", frame=frame)
+                empty.keyframe_insert(data_path=rotation_prop, frame=frame)
+
+            # Re-evaluate so animated empties show their keyed values again
+            scene.frame_set(scene.frame_current)
+
+            self.report({'INFO'}, f"Placed {hits} of {len(queries)} contacts on the ground.")
+            return {'FINISHED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Ground snap failed: {str(e)}")
+            return {'CANCELLED'}
+
+# MARKERS ----------------------------------------------------------------------------
+
+def snap_empty_matrix(bone_matrix_world, follow_rotation):
+    """Matrix for a snap empty at a bone, same placement as Prepare Snap."""
+    translation = Matrix.Translation(bone_matrix_world.to_translation())
+    if not follow_rotation:
+        return translation
+    return translation @ bone_matrix_world.to_3x3().normalized().to_4x4()
+
+def create_snap_empty(context, matrix_world, name="SnapEmpty"):
+    """Create an arrows empty without going through Object Mode."""
+    empty = bpy.data.objects.new(name, None)
+    empty.empty_display_type = 'ARROWS'
+    empty.empty_display_size = 0.15
+    empty.matrix_world = matrix_world
+    context.view_layer.active_layer_collection.collection.objects.link(empty)
+    return empty
+
+def add_snap_constraints(pose_bone, empty):
+    """Add the snapLoc/snapRot constraint pair targeting empty."""
+    copy_loc_constraint = pose_bone.constraints.new(type='COPY_LOCATION')
+    copy_loc_constraint.target = empty
+    copy_loc_constraint.name = f"snapLoc: {empty.name}"
+    copy_rot_constraint = pose_bone.constraints.new(type='COPY_ROTATION')
+    copy_rot_constraint.target = empty
+    copy_rot_constraint.name = f"snapRot: {empty.name}"
+    return copy_loc_constraint, copy_rot_constraint
+
+def key_snap_segment(constraints, start, end, snap_offset, unsnap_offset):
+    """Key the influence of constraints to blend in at start and out after end."""
+    for c in constraints:
+        for frame, value in ((start - snap_offset, 0.0), (start, 1.0), (end, 1.0), (end + unsnap_offset, 0.0)):
+            c.influence = value
+            c.keyframe_insert(data_path="influence", frame=frame)
+
+def marker_segments(scene, mode, bone_names):
+    """Return {bone_name: [(start, end), ...]} read from the timeline markers."""
+    segments = {name: [] for name in bone_names}
+    if mode == 'SELECTED':
+        frames = sorted(m.frame for m in scene.timeline_markers if m.select)
+        pairs = list(zip(frames[0::2], frames[1::2]))
+        for name in bone_names:
+            segments[name] = list(pairs)
+        return segments
+
+    # 'snap' opens a segment and 'unsnap' closes it, ':<bone>' restricts it to one bone
+    open_starts = {}
+    for marker in sorted(scene.timeline_markers, key=lambda m: m.frame):
+        kind, _sep, bone_name = marker.name.partition(":")
+        kind = kind.strip().lower()
+        bone_name = bone_name.strip()
+        for name in ([bone_name] if bone_name else bone_names):
+            if name not in segments:
+                continue
+            if kind == "unsnap":
+                if name in open_starts:
+                    segments[name].append((open_starts.pop(name), marker.frame))
+            elif kind == "snap":
+                open_starts.setdefault(name, marker.frame)
+    return segments
+
+class POSE_OT_snap_at_markers(bpy.types.Operator):
+    """Create snap empties, constraints and influence keys for every marker pair at once"""
+    bl_idname = "pose.snap_at_markers"
+    bl_label = "Snap at Markers"
+    bl_description = "Snap the selected bones for every pair of timeline markers in a single step"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return (context.mode == 'POSE' and 
+                context.active_object and 
+                context.active_object.type == 'ARMATURE' and
+                context.selected_pose_bones and
+                len(context.scene.timeline_markers) > 0 and
+                not context.scene.is_update_prepared)
+
+    def execute(self, context):
+        try:
+            scene = context.scene
+            arm_obj = context.active_object
+            bone_names = [pb.name for pb in context.selected_pose_bones if pb.id_data == arm_obj]
+            if scene.bone_tool_marker_mode == 'SELECTED':
+                selected_frames = sorted(m.frame for m in scene.timeline_markers if m.select)
+                if len(selected_frames) % 2:
+                    self.report({'WARNING'}, f"Odd number of selected markers, the marker at frame "
+                                             f"{selected_frames[-1]} has no pair and is ignored.")
+            segments = marker_segments(scene, scene.bone_tool_marker_mode, bone_names)
+            snapped_bones = [name for name in bone_names if segments[name]]
+            if not snapped_bones:
+                self.report({'WARNING'}, "No complete snap/unsnap marker pairs found for the selected bones.")
+                return {'CANCELLED'}
+
+            # Evaluate the pose once per distinct plant frame, shared by all bones
+            start_frames = sorted({start for name in snapped_bones for start, _end in segments[name]})
+            frame_index = {frame: i for i, frame in enumerate(start_frames)}
+            matrices = sample_bone_matrices(context, arm_obj, snapped_bones, start_frames)
+
+            plan = []
+            for name in snapped_bones:
+                for start, end in segments[name]:
+                    bone_matrix_world = Matrix(matrices[name][frame_index[start]].tolist())
+                    plan.append((name, start, end, snap_empty_matrix(bone_matrix_world, scene.bone_tool_follow_rotation)))
+            empty_matrices, _ground_hits = ground_snap_matrices(context, [p[3] for p in plan])
+
+            for (name, start, end, _matrix), matrix in zip(plan, empty_matrices):
+                empty = create_snap_empty(context, matrix)
+                constraints = add_snap_constraints(arm_obj.pose.bones[name], empty)
+                key_snap_segment(constraints, start, end,
+                                 scene.bone_tool_keyframe_offset,
+                                 scene.bone_tool_unsnap_offset)
+
+            self.report({'INFO'}, f"Created {len(plan)} snap segments on {len(snapped_bones)} bones "
+                                  f"from {len(start_frames)} marker frames.")
+            return {'FINISHED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Snap at markers failed: {str(e)}")
+            return {'CANCELLED'}
+
+# TRANSFER ---------------------------------------------------------------------------
+
+# Mixamo bone -> Rigify control, the reverse preset uses the inverted table
+MIXAMO_TO_RIGIFY = {
+    "Hips": "torso",
+    "Neck": "neck",
+    "Head": "head",
+    "LeftUpLeg": "thigh_fk.L",
+    "LeftLeg": "shin_fk.L",
+    "LeftFoot": "foot_ik.L",
+    "LeftToeBase": "toe.L",
+    "RightUpLeg": "thigh_fk.R",
+    "RightLeg": "shin_fk.R",
+    "RightFoot": "foot_ik.R",
+    "RightToeBase": "toe.R",
+    "LeftArm": "upper_arm_fk.L",
+    "LeftForeArm": "forearm_fk.L",
+    "LeftHand": "hand_ik.L",
+    "RightArm": "upper_arm_fk.R",
+    "RightForeArm": "forearm_fk.R",
+    "RightHand": "hand_ik.R",
+}
+
+def normalized_bone_key(name):
+    """Reduce a bone name to a key that ignores case, prefixes, separators and side notation."""
+    key = name.split(":")[-1].lower()
+    side = ""
+    match = re.match(r"^(left|right)[._\-\s]?(.+)$", key)
+    if match:
+        side, key = match.group(1)[0], match.group(2)
+    else:
+        match = re.match(r"^(.+?)(?:[._\-\s](l|r|left|right)|(left|right))$", key)
+        if match:
+            key, side = match.group(1), (match.group(2) or match.group(3))[0]
+    key = re.sub(r"[._\-\s]", "", key)
+    return f"{key}_{side}" if side else key
+
+def _bone_map_table(preset, text):
+    if preset == 'MIXAMO_TO_RIGIFY':
+        return dict(MIXAMO_TO_RIGIFY)
+    if preset == 'RIGIFY_TO_MIXAMO':
+        return {target: source for source, target in MIXAMO_TO_RIGIFY.items()}
+    table = {}
+    if preset == 'TEXT' and text:
+        for line in text.as_string().splitlines():
+            line = line.split("#")[0]
+            if "=" in line:
+                source, target = (part.strip() for part in line.split("=", 1))
+                if source and target:
+                    table[source] = target
+    return table
+
+def build_bone_map(preset, source_names, target_names, text=None):
+    """Return {source_bone: target_bone} for the bones a preset can match."""
+    target_set = set(target_names)
+    target_keys = {normalized_bone_key(name): name for name in target_names}
+    table = _bone_map_table(preset, text)
+    table_keys = {normalized_bone_key(name): target for name, target in table.items()}
+
+    mapping = {}
+    for name in source_names:
+        if preset == 'EXACT':
+            match = name if name in target_set else None
+        elif preset == 'NORMALIZED':
+            match = target_keys.get(normalized_bone_key(name))
+        else:
+            mapped = table.get(name) or table_keys.get(normalized_bone_key(name))
+            match = None
+            if mapped:
+                match = mapped if mapped in target_set else target_keys.get(normalized_bone_key(mapped))
+        if match:
+            mapping[name] = match
+    return mapping
+
+def _copy_constraint_settings(source, target):
+    for prop in source.bl_rna.properties:
+        if (prop.is_readonly or prop.type in {'POINTER', 'COLLECTION'} or
+            prop.identifier in {"name", "subtarget", "inverse_matrix", "show_expanded", "active"}):
+            continue
+        try:
+            setattr(target, prop.identifier, getattr(source, prop.identifier))
+        except (AttributeError, TypeError, ValueError):
+            pass
+
+def _copy_fcurve(source_fc, action, data_path, index=0):
+    """Copy the keys of source_fc into action under data_path."""
+    existing = action.fcurves.find(data_path, index=index)
+    if existing:
+        action.fcurves.remove(existing)
+    fc = action.fcurves.new(data_path, index=index)
+    source_kps = source_fc.keyframe_points
+    count = len(source_kps)
+    fc.keyframe_points.add(count)
+    buf = np.empty((count, 2), dtype=np.float32)
+    for attr in ("co", "handle_left", "handle_right"):
+        source_kps.foreach_get(attr, buf.ravel())
+        fc.keyframe_points.foreach_set(attr, buf.ravel())
+    for source_kp, kp in zip(source_kps, fc.keyframe_points):
+        kp.interpolation = source_kp.interpolation
+        kp.handle_left_type = source_kp.handle_left_type
+        kp.handle_right_type = source_kp.handle_right_type
+    fc.extrapolation = source_fc.extrapolation
+    fc.update()
+    return fc
+
+def _action_owner_count(action):
+    """Number of objects using action, ignoring fake users and BoneSnap's baked-action pointers."""
+    return sum(1 for obj in bpy.data.objects if obj.animation_data and obj.animation_data.action == action)
+
+def _rebase_empty_keys(source, target, rebase):
+    """Key target with the keyed motion of source, moved rigidly by the rebase matrix.
+
+    Location and rotation are rebased together so the motion follows the target's
+    heading, other channels are copied unchanged.
+    """
+    source_action = source.animation_data.action
+    rotation_prop = _empty_rotation_prop(source)
+    moved = [fc for fc in source_action.fcurves if fc.data_path in {"location", rotation_prop}]
+    target.rotation_mode = source.rotation_mode
+    target.animation_data_create()
+    target.animation_data.action = bpy.data.actions.new(f"{target.name}Action")
+
+    for frame in sorted({kp.co[0] for fc in moved for kp in fc.keyframe_points}):
+        location, rotation, _scale = (rebase @ _empty_matrix_at(source, frame)).decompose()
+        target.location = location
+        _set_empty_rotation(target, rotation)
+        target.keyframe_insert(data_path="location", frame=frame)
+        target.keyframe_insert(data_path=rotation_prop, frame=frame)
+
+    # Keep the source's interpolation on every rebased key
+    interpolation = {(fc.data_path, fc.array_index): {kp.co[0]: kp.interpolation for kp in fc.keyframe_points}
+                     for fc in moved}
+    for fc in target.animation_data.action.fcurves:
+        per_key = interpolation.get((fc.data_path, fc.array_index), {})
+        for kp in fc.keyframe_points:
+            kp.interpolation = per_key.get(kp.co[0], kp.interpolation)
+
+    for fc in source_action.fcurves:
+        if fc not in moved:
+            _copy_fcurve(fc, target.animation_data.action, fc.data_path, fc.array_index)
+
+def _snap_setups(arm_obj, frame_default):
+    """Group the BoneSnap constraints of an armature by the empty they target.
+
+    Returns a list of (bone_name, empty, kind, constraints, reference_frame).
+    """
+    action = arm_obj.animation_data.action if arm_obj.animation_data else None
+    setups = []
+    for pb in arm_obj.pose.bones:
+        groups = {}
+        for c in pb.constraints:
+            if not c.name.startswith(("snapLoc:", "snapRot:", "Tweak_ChildOf_")) or not c.target:
+                continue
+            kind = 'TWEAK' if c.name.startswith("Tweak_ChildOf_") else 'SNAP'
+            groups.setdefault((c.target.name, kind), (c.target, []))[1].append(c)
+        for (_name, kind), (empty, constraints) in groups.items():
+            frames = []
+            if kind == 'SNAP' and action:
+                # Plant frame: first frame the influence reaches 1.0
+                for c in constraints:
+                    fc = action.fcurves.find(f'{_pose_bone_path(pb.name)}.constraints["{bpy.utils.escape_identifier(c.name)}"].influence')
+                    if fc:
+                        frames.extend(kp.co[0] for kp in fc.keyframe_points if kp.co[1] >= 1.0)
+            elif kind == 'TWEAK' and empty.animation_data and empty.animation_data.action:
+                frames.extend(kp.co[0] for fc in empty.animation_data.action.fcurves
+                              if fc.data_path == "location" for kp in fc.keyframe_points)
+            setups.append((pb.name, empty, kind, constraints, min(frames) if frames else frame_default))
+    return setups
+
+class OBJECT_OT_transfer_snap_setup(bpy.types.Operator):
+    """Copy the snap and tweak setup of the active armature to the other selected armatures"""
+    bl_idname = "object.transfer_snap_setup"
+    bl_label = "Transfer Snap Setup"
+    bl_description = "Recreate the active armature's snap/tweak empties and constraints on the selected armatures through a bone map"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        source = context.active_object
+        return (source and
+                source.type == 'ARMATURE' and
+                any(obj.type == 'ARMATURE' and obj != source for obj in context.selected_objects))
+
+    def execute(self, context):
+        try:
+            scene = context.scene
+            source = context.active_object
+            targets = [obj for obj in context.selected_objects if obj.type == 'ARMATURE' and obj != source]
+            setups = _snap_setups(source, scene.frame_current)
+            if not setups:
+                self.report({'WARNING'}, f"No snap or tweak constraints found on '{source.name}'.")
+                return {'CANCELLED'}
+            source_action = source.animation_data.action if source.animation_data else None
+            source_bones = sorted({setup[0] for setup in setups})
+
+            transferred = 0
+            for target in targets:
+                bone_map = build_bone_map(scene.bone_tool_bone_map_preset, source_bones,
+                                          [bone.name for bone in target.data.bones],
+                                          scene.bone_tool_bone_map_text)
+                target_setups = [setup for setup in setups if setup[0] in bone_map]
+                if not target_setups:
+                    self.report({'WARNING'}, f"No mapped bones on '{target.name}'.")
+                    continue
+
+                # One batched pose evaluation per target for every bone and reference frame
+                bone_names = sorted({bone_map[setup[0]] for setup in target_setups})
+                frames = sorted({setup[4] for setup in target_setups})
+                frame_index = {frame: i for i, frame in enumerate(frames)}
+                matrices = sample_bone_matrices(context, target, bone_names, frames)
+
+                placements = []
+                for bone_name, empty, kind, constraints, frame in target_setups:
+                    bone_matrix_world = Matrix(matrices[bone_map[bone_name]][frame_index[frame]].tolist())
+                    if kind == 'SNAP':
+                        matrix = snap_empty_matrix(bone_matrix_world, scene.bone_tool_follow_rotation)
+                    else:
+                        matrix = Matrix.Translation(bone_matrix_world.to_translation())
+                    placements.append((bone_matrix_world, matrix))
+                snap_indices = [i for i, setup in enumerate(target_setups) if setup[2] == 'SNAP']
+                grounded, _ground_hits = ground_snap_matrices(context, [placements[i][1] for i in snap_indices])
+                for i, matrix in zip(snap_indices, grounded):
+                    placements[i] = (placements[i][0], matrix)
+
+                if not target.animation_data:
+                    target.animation_data_create()
+                if not target.animation_data.action:
+                    target.animation_data.action = bpy.data.actions.new(f"{target.name}Action")
+                elif _action_owner_count(target.animation_data.action) > 1:
+                    # Shared cycles must not collect other characters' influence curves
+                    shared_action = target.animation_data.action
+                    target.animation_data.action = shared_action.copy()
+                    target.animation_data.action.name = f"{shared_action.name}_{target.name}"
+                    self.report({'INFO'}, f"'{shared_action.name}' is shared, '{target.name}' now uses its own copy.")
+                target_action = target.animation_data.action
+
+                for (bone_name, empty, kind, constraints, frame), (bone_matrix_world, matrix) in zip(target_setups, placements):
+                    target_bone_name = bone_map[bone_name]
+                    target_pb = target.pose.bones[target_bone_name]
+                    new_empty = create_snap_empty(context, matrix, name=f"{empty.name}_{target.name}")
+                    new_empty.empty_display_type = empty.empty_display_type
+                    new_empty.empty_display_size = empty.empty_display_size
+
+                    # Animated empties keep their motion, rebased onto the target's pose
+                    if empty.animation_data and empty.animation_data.action:
+                        _rebase_empty_keys(empty, new_empty, matrix @ _empty_matrix_at(empty, frame).inverted())
+                        new_empty.matrix_world = matrix
+
+                    for c in constraints:
+                        new_constraint = target_pb.constraints.new(type=c.type)
+                        _copy_constraint_settings(c, new_constraint)
+                        new_constraint.target = new_empty
+                        if kind == 'SNAP':
+                            new_constraint.name = f"{c.name.split(':', 1)[0]}: {new_empty.name}"
+                        else:
+                            new_constraint.name = f"Tweak_ChildOf_{target_bone_name}"
+                            if c.inverse_matrix != Matrix.Identity(4):
+                                new_constraint.inverse_matrix = matrix.inverted() @ bone_matrix_world
+
+                        if source_action:
+                            source_fc = source_action.fcurves.find(
+                                f'{_pose_bone_path(bone_name)}.constraints["{bpy.utils.escape_identifier(c.name)}"].influence')
+                            if source_fc:
+                                _copy_fcurve(source_fc, target_action,
+                                             f'{_pose_bone_path(target_bone_name)}.constraints["{bpy.utils.escape_identifier(new_constraint.name)}"].influence')
+                    transferred += 1
+
+            self.report({'INFO'}, f"Transferred {transferred} snap setups to {len(targets)} armatures.")
+            return {'FINISHED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Transfer failed: {str(e)}")
+            return {'CANCELLED'}
+
+# FK EVALUATOR -----------------------------------------------------------------------
+
+FCURVE_INTERPOLATION_CODES = {'CONSTANT': 0, 'LINEAR': 1, 'BEZIER': 2}
+
+def _pose_bone_path(bone_name):
+    return f'pose.bones["{bpy.utils.escape_identifier(bone_name)}"]'
+
+def _bezier_segments(frames, p0, p1, p2, p3):
+    """Evaluate Bezier segments (p0 key, p1/p2 handles, p3 next key) at the given frames."""
+    # Same handle correction as Blender, keeps x(t) monotonic inside the segment
+    h1 = p0 - p1
+    h2 = p3 - p2
+    total = np.abs(h1[:, 0]) + np.abs(h2[:, 0])
+    span = p3[:, 0] - p0[:, 0]
+    fac = np.where(total > span, span / np.where(total == 0.0, 1.0, total), 1.0)[:, None]
+    p1 = p0 - fac * h1
+    p2 = p3 - fac * h2
+
+    def cubic(a, b, c, d, t):
+        u = 1.0 - t
+        return u * u * u * a + 3.0 * u * u * t * b + 3.0 * u * t * t * c + t * t * t * d
+
+    # Solve x(t) == frame for every segment at once by bisection
+    lo = np.zeros(len(frames))
+    hi = np.ones(len(frames))
+    for _ in range(32):
+        t = 0.5 * (lo + hi)
+        below = cubic(p0[:, 0], p1[:, 0], p2[:, 0], p3[:, 0], t) < frames
+        lo = np.where(below, t, lo)
+        hi = np.where(below, hi, t)
+    return cubic(p0[:, 1], p1[:, 1], p2[:, 1], p3[:, 1], 0.5 * (lo + hi))
+
+class _FCurveSampler:
+    """Evaluate one F-curve for many frames at once.
+
+    With windowed=True only the keys around the frames passed to evaluate() are read,
+    instead of copying the whole curve when the sampler is created.
+    """
+
+    def __init__(self, fc, windowed=False):
+        self.fcurve = fc
+        kps = fc.keyframe_points
+        self.count = len(kps)
+        self.windowed = windowed
+        self.linear_extrapolation = fc.extrapolation == 'LINEAR'
+        # Modifiers and easing interpolations are left to Blender's own evaluator
+        self.native = (self.count > 0 and len(fc.modifiers) == 0 and
+                       all(kp.interpolation in FCURVE_INTERPOLATION_CODES for kp in kps))
+        self.keys = self._read_keys(0, self.count) if self.native and not windowed else None
+
+    def _read_keys(self, start, stop):
+        """Return (co, handle_left, handle_right, codes) of keys start..stop-1."""
+        kps = self.fcurve.keyframe_points
+        # Keys stay float32 as Blender stores them, only the touched segments get promoted
+        if start == 0 and stop == self.count:
+            co = np.empty((stop, 2), dtype=np.float32)
+            handle_left = np.empty((stop, 2), dtype=np.float32)
+            handle_right = np.empty((stop, 2), dtype=np.float32)
+            kps.foreach_get("co", co.ravel())
+            kps.foreach_get("handle_left", handle_left.ravel())
+            kps.foreach_get("handle_right", handle_right.ravel())
+            points = kps
+        else:
+            points = [kps[i] for i in range(start, stop)]
+            co = np.array([tuple(kp.co) for kp in points], dtype=np.float32)
+            handle_left = np.array([tuple(kp.handle_left) for kp in points], dtype=np.float32)
+            handle_right = np.array([tuple(kp.handle_right) for kp in points], dtype=np.float32)
+        codes = np.array([FCURVE_INTERPOLATION_CODES[kp.interpolation] for kp in points], dtype=np.int8)
+        return co, handle_left, handle_right, codes
+
+    def _keys_up_to(self, frame):
+        """Number of keys at or before frame (bisect_right on the key frames)."""
+        kps = self.fcurve.keyframe_points
+        frame = np.float32(frame)
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if frame < np.float32(kps[mid].co[0]):
+                high = mid
+            else:
+                low = mid + 1
+        return low
+
+    def _window_keys(self, frames):
+        # Last key at or before the first frame up to the first key after the last one,
+        # at least two keys so extrapolation still sees the neighbour of an end key
+        start = min(max(self._keys_up_to(frames.min()) - 1, 0), max(self.count - 2, 0))
+        stop = min(max(self._keys_up_to(frames.max()), start + 1), self.count - 1)
+        return self._read_keys(start, stop + 1)
+
+    def evaluate(self, frames):
+        if not self.native:
+            return np.array([self.fcurve.evaluate(f) for f in frames], dtype=np.float64)
+        if not len(frames):
+            return np.empty(0)
+
+        keys = self._window_keys(frames) if self.windowed else self.keys
+        co, handle_left, handle_right, all_codes = keys
+        keys_x = co[:, 0]
+        out = np.empty(len(frames))
+        # A windowed slice only starts or ends at a frame outside the curve at its real ends
+        before = frames < keys_x[0]
+        after = frames >= keys_x[-1]
+        out[before] = self._extrapolate(keys, frames[before], 0, 1)
+        out[after] = self._extrapolate(keys, frames[after], len(keys_x) - 1, -1)
+
+        inside = ~(before | after)
+        if inside.any():
+            f = frames[inside]
+            seg = np.searchsorted(keys_x, f.astype(np.float32), side='right') - 1
+            p0 = co[seg].astype(np.float64)
+            p3 = co[seg + 1].astype(np.float64)
+            codes = all_codes[seg]
+            values = p0[:, 1].copy()
+
+            linear = codes == FCURVE_INTERPOLATION_CODES['LINEAR']
+            if linear.any():
+                t = (f[linear] - p0[linear, 0]) / (p3[linear, 0] - p0[linear, 0])
+                values[linear] = p0[linear, 1] + t * (p3[linear, 1] - p0[linear, 1])
+
+            bezier = codes == FCURVE_INTERPOLATION_CODES['BEZIER']
+            if bezier.any():
+                values[bezier] = _bezier_segments(
+                    f[bezier],
+                    p0[bezier],
+                    handle_right[seg[bezier]].astype(np.float64),
+                    handle_left[seg[bezier] + 1].astype(np.float64),
+                    p3[bezier])
+            out[inside] = values
+        return out
+
+    def _extrapolate(self, keys, frames, endpoint, direction):
+        # Mirrors fcurve_eval_keyframes_extrapolate()
+        co, handle_left, handle_right, codes = keys
+        key_x, key_y = (float(v) for v in co[endpoint])
+        code = codes[endpoint]
+        if code == FCURVE_INTERPOLATION_CODES['CONSTANT'] or not self.linear_extrapolation:
+            return np.full(len(frames), key_y)
+        if code == FCURVE_INTERPOLATION_CODES['LINEAR']:
+            if self.count == 1:
+                return np.full(len(frames), key_y)
+            other_x, other_y = (float(v) for v in co[endpoint + direction])
+        else:
+            handle = handle_left if direction > 0 else handle_right
+            other_x, other_y = (float(v) for v in handle[endpoint])
+        if other_x == key_x:
+            return np.full(len(frames), key_y)
+        slope = (other_y - key_y) / (other_x - key_x)
+        return key_y - slope * (key_x - frames)
+
+def _euler_to_matrices(euler, order):
+    """Convert (n, 3) euler angles in a Blender rotation order to (n, 3, 3) matrices."""
+    axes = {}
+    for index, axis in enumerate("XYZ"):
+        a, b = ((1, 2), (2, 0), (0, 1))[index]
+        cos = np.cos(euler[:, index])
+        sin = np.sin(euler[:, index])
+        m = np.zeros((len(euler), 3, 3))
+        m[:, index, index] = 1.0
+        m[:, a, a] = cos
+        m[:, a, b] = -sin
+        m[:, b, a] = sin
+        m[:, b, b] = cos
+        axes[axis] = m
+    return axes[order[2]] @ axes[order[1]] @ axes[order[0]]
+
+def _quaternion_to_matrices(quat):
+    """Convert (n, 4) WXYZ quaternions to (n, 3, 3) matrices, normalising like Blender does."""
+    norm = np.linalg.norm(quat, axis=1)
+    valid = norm > 0.0
+    q = np.where(valid[:, None], quat / np.where(valid, norm, 1.0)[:, None], [1.0, 0.0, 0.0, 0.0])
+    w, x, y, z = q.T
+    m = np.empty((len(q), 3, 3))
+    m[:, 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    m[:, 0, 1] = 2.0 * (x * y - w * z)
+    m[:, 0, 2] = 2.0 * (x * z + w * y)
+    m[:, 1, 0] = 2.0 * (x * y + w * z)
+    m[:, 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    m[:, 1, 2] = 2.0 * (y * z - w * x)
+    m[:, 2, 0] = 2.0 * (x * z - w * y)
+    m[:, 2, 1] = 2.0 * (y * z + w * x)
+    m[:, 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+    return m
+
+def _axis_angle_to_matrices(axis_angle):
+    """Convert (n, 4) angle/XYZ axis rotations to (n, 3, 3) matrices."""
+    angle = axis_angle[:, 0]
+    axis = axis_angle[:, 1:]
+    norm = np.linalg.norm(axis, axis=1)
+    valid = norm > 0.0
+    axis = np.where(valid[:, None], axis / np.where(valid, norm, 1.0)[:, None], 0.0)
+    half = np.where(valid, angle, 0.0) * 0.5
+    quat = np.concatenate((np.cos(half)[:, None], axis * np.sin(half)[:, None]), axis=1)
+    return _quaternion_to_matrices(quat)
+
+def _chain_bone_names(arm_obj, bone_names):
+    """Return the bones and all their ancestors, parents first."""
+    order = []
+    seen = set()
+    for name in bone_names:
+        chain = []
+        bone = arm_obj.data.bones[name]
+        while bone and bone.name not in seen:
+            chain.append(bone.name)
+            seen.add(bone.name)
+            bone = bone.parent
+        order.extend(reversed(chain))
+    return order
+
+def default_inheritance(bone):
+    """Check whether a bone inherits its parent's full transform, as FKEvaluator assumes."""
+    return bone.use_inherit_rotation and bone.inherit_scale == 'FULL' and bone.use_local_location
+
+def fk_evaluation_supported(arm_obj, bone_names):
+    """Check whether the bones are plain FK chains that FKEvaluator can reproduce."""
+    if arm_obj.parent or arm_obj.constraints:
+        return False
+    # Rest Position ignores the action entirely
+    if arm_obj.data.pose_position == 'REST':
+        return False
+    # Drivers or animation on the armature data can change bone settings
+    data_anim = arm_obj.data.animation_data
+    if data_anim and (data_anim.action or len(data_anim.drivers) or len(data_anim.nla_tracks)):
+        return False
+
+    anim = arm_obj.animation_data
+    if anim:
+        if any(not track.mute and len(track.strips) for track in anim.nla_tracks):
+            return False
+        if (anim.action_influence != 1.0 or
+            anim.action_blend_type != 'REPLACE' or
+            anim.action_extrapolation != 'HOLD'):
+            return False
+        if anim.action and any(not fc.data_path.startswith("pose.bones[") for fc in anim.action.fcurves):
+            return False
+        # Drivers on the object's own transform would move matrix_world between frames
+        if any(not fc.data_path.startswith("pose.bones[") for fc in anim.drivers):
+            return False
+
+    # IK anywhere in the rig can move bones it does not own
+    for pb in arm_obj.pose.bones:
+        if any(c.type in {'IK', 'SPLINE_IK'} and not c.mute for c in pb.constraints):
+            return False
+
+    chain = _chain_bone_names(arm_obj, bone_names)
+    driven = [fc.data_path for fc in anim.drivers] if anim else []
+    for name in chain:
+        pb = arm_obj.pose.bones[name]
+        bone = pb.bone
+        if any(not c.mute for c in pb.constraints):
+            return False
+        if not default_inheritance(bone):
+            return False
+        bone_path = _pose_bone_path(name)
+        if any(path.startswith(bone_path) for path in driven):
+            return False
+    return True
+
+class FKEvaluator:
+    """Evaluate world matrices of plain FK bones straight from the armature's action.
+
+    Rest matrices, the parent hierarchy and the F-curve keys are read once when the
+    evaluator is created, evaluate() then only runs batched NumPy code. With
+    windowed=True the keys are instead read per evaluate() call, only around the
+    requested frames.
+    """
+
+    def __init__(self, arm_obj, bone_names, windowed=False):
+        self.bone_names = list(bone_names)
+        self.order = _chain_bone_names(arm_obj, self.bone_names)
+        self.matrix_world = np.array(arm_obj.matrix_world)
+
+        fcurves = {}
+        anim = arm_obj.animation_data
+        if anim and anim.action:
+            for fc in anim.action.fcurves:
+                # Blender skips muted curves and curves in muted groups
+                if fc.mute or (fc.group and fc.group.mute):
+                    continue
+                if len(fc.keyframe_points) or len(fc.modifiers):
+                    fcurves[(fc.data_path, fc.array_index)] = fc
+
+        self.bones = {}
+        for name in self.order:
+            pb = arm_obj.pose.bones[name]
+            bone = pb.bone
+            rest = np.array(bone.matrix_local)
+            if bone.parent:
+                rest = np.linalg.inv(np.array(bone.parent.matrix_local)) @ rest
+            rotation_prop = {'QUATERNION': 'rotation_quaternion',
+                             'AXIS_ANGLE': 'rotation_axis_angle'}.get(pb.rotation_mode, 'rotation_euler')
+            bone_path = _pose_bone_path(name)
+            channels = {}
+            for prop in ("location", rotation_prop, "scale"):
+                samplers = []
+                for index, value in enumerate(getattr(pb, prop)):
+                    fc = fcurves.get((f"{bone_path}.{prop}", index))
+                    # Unkeyed channels keep their current value
+                    samplers.append(_FCurveSampler(fc, windowed) if fc else float(value))
+                channels[prop] = samplers
+            self.bones[name] = (bone.parent.name if bone.parent else None, rest, pb.rotation_mode, rotation_prop, channels)
+
+    def evaluate(self, frames):
+        """Return {bone_name: (len(frames), 4, 4) world matrices} for the requested bones."""
+        frames = np.asarray(frames, dtype=np.float64)
+        count = len(frames)
+        pose = {}
+        for name in self.order:
+            parent, rest, rotation_mode, rotation_prop, channels = self.bones[name]
+            values = {
+                prop: np.stack([s.evaluate(frames) if isinstance(s, _FCurveSampler) else np.full(count, s)
+                                for s in samplers], axis=1)
+                for prop, samplers in channels.items()
+            }
+            if rotation_mode == 'QUATERNION':
+                rotation = _quaternion_to_matrices(values[rotation_prop])
+            elif rotation_mode == 'AXIS_ANGLE':
+                rotation = _axis_angle_to_matrices(values[rotation_prop])
+            else:
+                rotation = _euler_to_matrices(values[rotation_prop], rotation_mode)
+
+            basis = np.zeros((count, 4, 4))
+            basis[:, :3, :3] = rotation * values["scale"][:, None, :]
+            basis[:, :3, 3] = values["location"]
+            basis[:, 3, 3] = 1.0
+            local = rest @ basis
+            pose[name] = local if parent is None else pose[parent] @ local
+        return {name: self.matrix_world @ pose[name] for name in self.bone_names}
+
+def _sample_rigs_depsgraph(context, requests, frames, local=False):
+    """Sample several armatures through the depsgraph, one shared frame_set per frame.
+
+    requests is a list of (arm_obj, bone_names), the result is keyed by armature name.
+    With local=True the visual basis matrices are returned instead of world matrices,
+    converted by Blender like Bake does so any inheritance setting is respected.
+    """
+    scene = context.scene
+    frame_orig = scene.frame_current
+    subframe_orig = scene.frame_subframe
+    out = {arm_obj.name: {name: np.empty((len(frames), 4, 4)) for name in bone_names}
+           for arm_obj, bone_names in requests}
+    try:
+        for i, frame in enumerate(frames):
+            whole = math.floor(frame)
+            scene.frame_set(int(whole), subframe=float(frame - whole))
+            for arm_obj, bone_names in requests:
+                matrix_world = arm_obj.matrix_world
+                rig_out = out[arm_obj.name]
+                for name in bone_names:
+                    pose_bone = arm_obj.pose.bones[name]
+                    if local:
+                        matrix = arm_obj.convert_space(pose_bone=pose_bone, matrix=pose_bone.matrix,
+                                                       from_space='POSE', to_space='LOCAL')
+                    else:
+                        matrix = matrix_world @ pose_bone.matrix
+                    rig_out[name][i] = np.array(matrix)
+    finally:
+        scene.frame_set(frame_orig, subframe=subframe_orig)
+    return out
+
+def _sample_matrices_depsgraph(context, arm_obj, bone_names, frames):
+    """Sample world matrices through the depsgraph, one frame_set per frame."""
+    return _sample_rigs_depsgraph(context, [(arm_obj, bone_names)], frames)[arm_obj.name]
+
+def sample_bone_matrices(context, arm_obj, bone_names, frames):
+    """Return {bone_name: (len(frames), 4, 4) world matrices} for the given frames.
+
+    Plain FK chains are evaluated with FKEvaluator, bones with constraints or
+    drivers fall back to depsgraph evaluation.
+    """
+    if fk_evaluation_supported(arm_obj, bone_names):
+        return FKEvaluator(arm_obj, bone_names).evaluate(frames)
+    return _sample_matrices_depsgraph(context, arm_obj, bone_names, frames)
+
+def sample_rigs_matrices(context, requests, frames, timings=None, local=False):
+    """Like sample_bone_matrices for several armatures, keyed by armature name.
+
+    Rigs needing the depsgraph share a single evaluation per frame. With local=True
+    visual basis matrices are returned instead of world matrices. When a dict is
+    passed as timings, seconds spent per armature (and under None for the shared
+    evaluation) are added to it.
+    """
+    results = {}
+    shared = []
+    for arm_obj, bone_names in requests:
+        if fk_evaluation_supported(arm_obj, bone_names):
+            start = time.perf_counter()
+            if local:
+                # FK chains use default inheritance, so the parent's world pose is enough
+                parents = {arm_obj.data.bones[name].parent.name for name in bone_names
+                           if arm_obj.data.bones[name].parent}
+                world = FKEvaluator(arm_obj, sorted(set(bone_names) | parents)).evaluate(frames)
+                rig_results = {}
+                for name in bone_names:
+                    parent = arm_obj.data.bones[name].parent
+                    rig_results[name] = world_to_basis(arm_obj, name, world[name],
+                                                       world[parent.name] if parent else None)
+                results[arm_obj.name] = rig_results
+            else:
+                results[arm_obj.name] = FKEvaluator(arm_obj, bone_names).evaluate(frames)
+            if timings is not None:
+                timings[arm_obj.name] = timings.get(arm_obj.name, 0.0) + time.perf_counter() - start
+        else:
+            shared.append((arm_obj, bone_names))
+    if shared:
+        start = time.perf_counter()
+        results.update(_sample_rigs_depsgraph(context, shared, frames, local))
+        if timings is not None:
+            timings[None] = timings.get(None, 0.0) + time.perf_counter() - start
+    return results
+
+class POSE_OT_check_fk_evaluator(bpy.types.Operator):
+    """Compare the NumPy FK evaluator against Blender's depsgraph for the selected bones"""
+    bl_idname = "pose.check_fk_evaluator"
+    bl_label = "Check FK Evaluator"
+    bl_description = "Compare NumPy FK trajectories of the selected bones with Blender's evaluation over the frame range"
+    bl_options = {'REGISTER'}
+
+    tolerance: bpy.props.FloatProperty(
+        name="Tolerance",
+        description="Largest matrix difference still considered a match",
+        default=1e-4,
+        min=0.0
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.mode == 'POSE' and 
+                context.active_object and 
+                context.active_object.type == 'ARMATURE' and
+                context.selected_pose_bones)
+
+    def execute(self, context):
+        try:
+            arm_obj = context.active_object
+            bone_names = [pb.name for pb in context.selected_pose_bones if pb.id_data == arm_obj]
+            if not fk_evaluation_supported(arm_obj, bone_names):
+                self.report({'WARNING'}, "Selected bones have constraints or drivers, they are evaluated through the depsgraph.")
+                return {'CANCELLED'}
+
+            frames = np.arange(context.scene.frame_start, context.scene.frame_end + 1, dtype=np.float64)
+            start = time.perf_counter()
+            fast = FKEvaluator(arm_obj, bone_names).evaluate(frames)
+            fast_time = time.perf_counter() - start
+            start = time.perf_counter()
+            reference = _sample_matrices_depsgraph(context, arm_obj, bone_names, frames)
+            reference_time = time.perf_counter() - start
+
+            error = max(float(np.abs(fast[name] - reference[name]).max()) for name in bone_names)
+            message = (f"Max deviation {error:.2e} over {len(frames)} frames "
+                       f"(NumPy {fast_time * 1000:.1f} ms, depsgraph {reference_time * 1000:.1f} ms)")
+            self.report({'WARNING'} if error > self.tolerance else {'INFO'}, message)
+            return {'FINISHED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"FK evaluator check failed: {str(e)}")
+            return {'CANCELLED'}
+
+# STREAMING CLEANUP ------------------------------------------------------------------
+
+def world_to_basis(arm_obj, bone_name, world, parent_world=None):
+    """Convert (n, 4, 4) world matrices of a bone to basis matrices.
+
+    parent_world holds the parent's world matrices for the same frames, the bone
+    must use default inheritance (see default_inheritance()).
+    """
+    bone = arm_obj.data.bones[bone_name]
+    rest = np.array(bone.matrix_local)
+    if bone.parent:
+        space = parent_world @ (np.linalg.inv(np.array(bone.parent.matrix_local)) @ rest)
+    else:
+        space = np.array(arm_obj.matrix_world) @ rest
+    return np.linalg.inv(space) @ world
+
+class _BoneBakeState:
+    """Per-bone state carried from one frame window to the next."""
+
+    def __init__(self):
+        self.last_position = None
+        self.in_contact = False
+        self.pin = None
+        self.rotation = None
+        self.curves = {}
+
+def _pin_contacts(world, state, height, speed):
+    """Hold a bone still while it touches the ground, continuing segments across windows."""
+    positions = world[:, :3, 3]
+    previous = positions[0] if state.last_position is None else state.last_position
+    steps = np.diff(np.vstack((previous, positions)), axis=0)
+    contact = (positions[:, 2] < height) & (np.linalg.norm(steps, axis=1) < speed)
+
+    # Index of the frame each contact segment started at, -1 for a segment carried over
+    starts = contact & ~np.concatenate(([state.in_contact], contact[:-1]))
+    segment = np.maximum.accumulate(np.where(starts, np.arange(len(contact)), -1))
+    pinned = world.copy()
+    carried = contact & (segment < 0)
+    if carried.any():
+        pinned[carried] = state.pin
+    own = contact & (segment >= 0)
+    pinned[own] = world[segment[own]]
+
+    state.last_position = positions[-1]
+    state.in_contact = bool(contact[-1])
+    state.pin = pinned[-1] if state.in_contact else None
+    return pinned, int(contact.sum())
+
+def _basis_channels(pose_bone, basis, state):
+    """Decompose (n, 4, 4) basis matrices into {prop: (n, k) values} for a pose bone.
+
+    Rotation continuity is carried in state.rotation between calls.
+    """
+    rotation_mode = pose_bone.rotation_mode
+    rotation_prop = {'QUATERNION': 'rotation_quaternion',
+                     'AXIS_ANGLE': 'rotation_axis_angle'}.get(rotation_mode, 'rotation_euler')
+    locations = []
+    rotations = []
+    scales = []
+    for matrix in basis:
+        location, quaternion, scale = Matrix(matrix.tolist()).decompose()
+        if rotation_mode == 'QUATERNION':
+            if state.rotation is not None:
+                quaternion.make_compatible(state.rotation)
+            state.rotation = quaternion
+            rotations.append(tuple(quaternion))
+        elif rotation_mode == 'AXIS_ANGLE':
+            axis, angle = quaternion.to_axis_angle()
+            rotations.append((angle, *axis))
+        else:
+            if state.rotation is None:
+                state.rotation = quaternion.to_euler(rotation_mode)
+            else:
+                state.rotation = quaternion.to_euler(rotation_mode, state.rotation)
+            rotations.append(tuple(state.rotation))
+        locations.append(tuple(location))
+        scales.append(tuple(scale))
+    return {"location": np.array(locations), rotation_prop: np.array(rotations), "scale": np.array(scales)}
+
+def _write_basis_keys(action, pose_bone, frames, basis, state):
+    """Append location/rotation/scale keys of one bone for a window of frames."""
+    bone_path = _pose_bone_path(pose_bone.name)
+    for prop, values in _basis_channels(pose_bone, basis, state).items():
+        for index in range(values.shape[1]):
+            fc = state.curves.get((prop, index))
+            if fc is None:
+                fc = action.fcurves.new(f"{bone_path}.{prop}", index=index, action_group=pose_bone.name)
+                state.curves[(prop, index)] = fc
+            # Windows come in frame order, so the keys are added as one block after the
+            # previous window's instead of inserted (and sorted in) one at a time
+            kps = fc.keyframe_points
+            tail = len(kps)
+            kps.add(len(frames))
+            for offset, (frame, value) in enumerate(zip(frames, values[:, index])):
+                kps[tail + offset].co = (float(frame), float(value))
+
+def _copy_unbaked_curves(source, action, baked_paths):
+    """Copy the curves of source whose data path is not in baked_paths into action."""
+    for source_fc in source.fcurves:
+        if source_fc.data_path in baked_paths:
+            continue
+        fc = _copy_fcurve(source_fc, action, source_fc.data_path, source_fc.array_index)
+        fc.mute = source_fc.mute
+        if source_fc.group:
+            fc.group = action.groups.get(source_fc.group.name) or action.groups.new(source_fc.group.name)
+        for source_modifier in source_fc.modifiers:
+            _copy_constraint_settings(source_modifier, fc.modifiers.new(source_modifier.type))
+
+class POSE_OT_stream_contact_cleanup(bpy.types.Operator):
+    """Detect ground contacts and bake pinned poses window by window"""
+    bl_idname = "pose.stream_contact_cleanup"
+    bl_label = "Stream Cleanup"
+    bl_description = "Sample, detect contacts, pin and bake the selected bones in fixed-size frame windows"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return (context.mode == 'POSE' and 
+                context.active_object and 
+                context.active_object.type == 'ARMATURE' and
+                context.selected_pose_bones)
+
+    def execute(self, context):
+        try:
+            scene = context.scene
+            arm_obj = context.active_object
+            selected = {pb.name for pb in context.selected_pose_bones if pb.id_data == arm_obj}
+            # Parents first, children are keyed against their parent's pinned pose
+            bone_names = [name for name in _chain_bone_names(arm_obj, sorted(selected)) if name in selected]
+            parents = {name: arm_obj.data.bones[name].parent.name if arm_obj.data.bones[name].parent else None
+                       for name in bone_names}
+            sampled = sorted(selected | {parent for parent in parents.values() if parent})
+
+            # Keys are converted back to basis assuming the parent's full transform is inherited
+            custom = [name for name in bone_names if not default_inheritance(arm_obj.data.bones[name])]
+            if custom:
+                self.report({'WARNING'}, f"Bones with custom inheritance can't be streamed: {', '.join(custom)}")
+                return {'CANCELLED'}
+
+            if not arm_obj.animation_data:
+                arm_obj.animation_data_create()
+            source = arm_obj.animation_data.action
+            # Keys go into new curves of a new action, the source stays assigned and
+            # unchanged while frames are still read from it, then the new action replaces it
+            action = bpy.data.actions.new(f"{arm_obj.name}Action")
+            if source:
+                baked_paths = {f"{_pose_bone_path(name)}.{prop}" for name in bone_names for prop in POSE_TRANSFORM_PROPS}
+                _copy_unbaked_curves(source, action, baked_paths)
+
+            # Keys are read per window too, only around the frames being evaluated
+            evaluator = FKEvaluator(arm_obj, sampled, windowed=True) if fk_evaluation_supported(arm_obj, sampled) else None
+            states = {name: _BoneBakeState() for name in bone_names}
+            window = scene.bone_tool_stream_window
+            contact_frames = 0
+
+            start_time = time.perf_counter()
+            for window_start in range(scene.frame_start, scene.frame_end + 1, window):
+                frames = np.arange(window_start, min(window_start + window, scene.frame_end + 1), dtype=np.float64)
+                if evaluator:
+                    world = evaluator.evaluate(frames)
+                else:
+                    world = _sample_matrices_depsgraph(context, arm_obj, sampled, frames)
+
+                final = {}
+                for name in bone_names:
+                    pinned, contacts = _pin_contacts(world[name], states[name],
+                                                     scene.bone_tool_contact_height,
+                                                     scene.bone_tool_contact_speed)
+                    contact_frames += contacts
+                    final[name] = pinned
+                    parent = parents[name]
+                    parent_world = final.get(parent, world.get(parent)) if parent else None
+                    basis = world_to_basis(arm_obj, name, pinned, parent_world)
+                    _write_basis_keys(action, arm_obj.pose.bones[name], frames, basis, states[name])
+
+            for state in states.values():
+                for fc in state.curves.values():
+                    fc.update()
+            kept = ""
+            if source:
+                source_name = source.name
+                source.name = f"{source_name}_source"
+                source.use_fake_user = True
+                action.name = source_name
+                kept = f" Original keys kept in '{source.name}'."
+            arm_obj.animation_data.action = action
+
+            # Keys now hold the visual pose, constraints would be applied twice (same as Bake)
+            for name in bone_names:
+                pose_bone = arm_obj.pose.bones[name]
+                for c in list(pose_bone.constraints):
+                    pose_bone.constraints.remove(c)
+
+            elapsed = time.perf_counter() - start_time
+            frame_count = scene.frame_end - scene.frame_start + 1
+            scene.bonesnap_stream_fps = frame_count / elapsed if elapsed > 0 else 0.0
+            self.report({'INFO'}, f"Cleaned {frame_count} frames ({contact_frames} contact frames) "
+                                  f"at {scene.bonesnap_stream_fps:.0f} fps in windows of {window}.{kept}")
+            return {'FINISHED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Stream cleanup failed: {str(e)}")
+            return {'CANCELLED'}
+
+# PROFILER ---------------------------------------------------------------------------
+
+# Results of the last profiling run, shown in the panel and written by the export operator
+_profile_results = {}
+
+def _time_frames(scene, frames, repeats=2):
+    """Return the best-of-repeats seconds per frame spent evaluating and drawing frames."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for frame in frames:
+            scene.frame_set(frame)
+            # frame_set only evaluates, playback also pays for drawing the viewports
+            bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(frames)
+
+class POSE_OT_profile_snap_cost(bpy.types.Operator):
+    """Time playback with and without BoneSnap constraints and empties"""
+    bl_idname = "pose.profile_snap_cost"
+    bl_label = "Profile Snap Cost"
+    bl_description = "Time evaluation and redraw per frame as is, with BoneSnap constraints muted and with the empties hidden"
+    bl_options = {'REGISTER'}
+
+    @classmethod
+    def poll(cls, context):
+        return (context.active_object and
+                context.active_object.type == 'ARMATURE')
+
+    def execute(self, context):
+        try:
+            scene = context.scene
+            arm_obj = context.active_object
+            constraints = [(pb.name, c) for pb in arm_obj.pose.bones for c in pb.constraints
+                           if c.name.startswith(("snapLoc:", "snapRot:", "Tweak_ChildOf_"))]
+            if not constraints:
+                self.report({'WARNING'}, f"No BoneSnap constraints found on '{arm_obj.name}'.")
+                return {'CANCELLED'}
+            empties = list({c.target.name: c.target for _bone, c in constraints if c.target}.values())
+
+            step = max(1, (scene.frame_end - scene.frame_start + 1) // scene.bone_tool_profile_samples)
+            frames = list(range(scene.frame_start, scene.frame_end + 1, step))[:scene.bone_tool_profile_samples]
+            frame_orig = scene.frame_current
+            mute_orig = [(c, c.mute) for _bone, c in constraints]
+            hide_orig = [(empty, empty.hide_viewport) for empty in empties]
+
+            try:
+                as_is = _time_frames(scene, frames)
+
+                for c, _mute in mute_orig:
+                    c.mute = True
+                muted = _time_frames(scene, frames)
+                for c, mute in mute_orig:
+                    c.mute = mute
+
+                # Cost of a constraint is what muting it alone saves
+                constraint_costs = []
+                for bone_name, c in constraints:
+                    if c.mute:
+                        continue
+                    c.mute = True
+                    constraint_costs.append({"bone": bone_name, "constraint": c.name,
+                                             "ms": (as_is - _time_frames(scene, frames)) * 1000.0})
+                    c.mute = False
+
+                # Empties stay evaluated as constraint targets, hiding them only saves drawing
+                for empty, _hidden in hide_orig:
+                    empty.hide_viewport = True
+                hidden = _time_frames(scene, frames)
+            finally:
+                for c, mute in mute_orig:
+                    c.mute = mute
+                for empty, hidden_state in hide_orig:
+                    empty.hide_viewport = hidden_state
+                scene.frame_set(frame_orig)
+
+            bone_costs = {}
+            for entry in constraint_costs:
+                bone_costs[entry["bone"]] = bone_costs.get(entry["bone"], 0.0) + entry["ms"]
+
+            _profile_results.clear()
+            _profile_results.update({
+                "armature": arm_obj.name,
+                "frames": len(frames),
+                "as_is_ms": as_is * 1000.0,
+                "constraints_muted_ms": muted * 1000.0,
+                "empties_hidden_ms": hidden * 1000.0,
+                "constraints": sorted(constraint_costs, key=lambda entry: entry["ms"], reverse=True),
+                "bones": sorted(({"bone": name, "ms": ms} for name, ms in bone_costs.items()),
+                                key=lambda entry: entry["ms"], reverse=True),
+            })
+            self.report({'INFO'}, f"As is {as_is * 1000.0:.2f} ms/frame, constraints muted {muted * 1000.0:.2f} ms/frame, "
+                                  f"empties hidden {hidden * 1000.0:.2f} ms/frame over {len(frames)} frames.")
+            return {'FINISHED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Profiling failed: {str(e)}")
+            return {'CANCELLED'}
+
+class POSE_OT_export_snap_profile(bpy.types.Operator, ExportHelper):
+    """Append the last profiling results to a JSON Lines file"""
+    bl_idname = "pose.export_snap_profile"
+    bl_label = "Export Snap Profile"
+    bl_description = "Append the last BoneSnap profiling results to a .jsonl file to track rig performance over time"
+
+    filename_ext = ".jsonl"
+    filter_glob: bpy.props.StringProperty(default="*.jsonl", options={'HIDDEN'})
+
+    @classmethod
+    def poll(cls, context):
+        return bool(_profile_results)
+
+    def execute(self, context):
+        try:
+            record = dict(_profile_results)
+            record["timestamp"] = datetime.now().isoformat(timespec="seconds")
+            record["blend_file"] = bpy.data.filepath
+            record["blender"] = bpy.app.version_string
+            with open(self.filepath, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            self.report({'INFO'}, f"Appended profile of '{record['armature']}' to {self.filepath}")
+            return {'FINISHED'}
+        except OSError as e:
+            self.report({'ERROR'}, f"Export failed: {str(e)}")
+            return {'CANCELLED'}
+
+# BAKE CACHE -------------------------------------------------------------------------
+
+POSE_TRANSFORM_PROPS = ("location", "rotation_quaternion", "rotation_euler", "rotation_axis_angle", "scale")
+
+def _hash_matrix(hasher, matrix):
+    hasher.update(array('f', [v for row in matrix for v in row]).tobytes())
+
+# UI-only properties that never change what a bake produces
+_RNA_HASH_IGNORED = {"rna_type", "show_expanded", "active", "select", "is_active"}
+
+def _hash_rna(hasher, struct, skip=()):
+    """Hash every property of an RNA struct, recursing into collections, ID pointers by name."""
+    for prop in struct.bl_rna.properties:
+        identifier = prop.identifier
+        if identifier in _RNA_HASH_IGNORED or identifier in skip:
+            continue
+        value = getattr(struct, identifier, None)
+        if prop.type == 'COLLECTION':
+            for item in value:
+                _hash_rna(hasher, item)
+            continue
+        if prop.type == 'POINTER':
+            # Nested structs other than IDs are hashed by their owners where they matter
+            value = value.name if isinstance(value, bpy.types.ID) else None
+        elif getattr(prop, "is_array", False) or hasattr(value, "__len__") and not isinstance(value, str):
+            value = tuple(value)
+        hasher.update(f"{identifier}={value!r};".encode())
+
+def _hash_fcurves(hasher, fcurves):
+    # Keyframe data is pulled with foreach_get so long actions stay cheap to fingerprint
+    for fc in fcurves:
+        kps = fc.keyframe_points
+        hasher.update(f"{fc.data_path}[{fc.array_index}]:{fc.mute}:{fc.extrapolation}".encode())
+        if fc.group:
+            hasher.update(f"group:{fc.group.name}:{fc.group.mute}".encode())
+        buf = array('f', [0.0]) * (len(kps) * 2)
+        for attr in ("co", "handle_left", "handle_right"):
+            kps.foreach_get(attr, buf)
+            hasher.update(buf.tobytes())
+        buf = array('f', [0.0]) * len(kps)
+        for attr in ("back", "amplitude", "period"):
+            kps.foreach_get(attr, buf)
+            hasher.update(buf.tobytes())
+        # Enums come out of foreach_get as their integer values
+        buf = array('i', [0]) * len(kps)
+        for attr in ("interpolation", "easing"):
+            kps.foreach_get(attr, buf)
+            hasher.update(buf.tobytes())
+        for modifier in fc.modifiers:
+            _hash_rna(hasher, modifier)
+
+def _hash_nla_strips(hasher, strips, animated):
+    for strip in strips:
+        _hash_rna(hasher, strip, skip={"strips", "fcurves"})
+        _hash_fcurves(hasher, strip.fcurves)
+        if strip.action:
+            _hash_fcurves(hasher, strip.action.fcurves)
+            animated.update(fc.data_path for fc in strip.action.fcurves)
+        _hash_nla_strips(hasher, strip.strips, animated)
+
+def _hash_animation(hasher, obj):
+    """Hash the action, NLA and drivers of an ID, return the set of animated data paths."""
+    anim = obj.animation_data
+    if not anim:
+        return set()
+    animated = set()
+    hasher.update(f"anim:{anim.action_influence}:{anim.action_blend_type}:{anim.action_extrapolation}:"
+                  f"{anim.use_nla}:{anim.use_tweak_mode}".encode())
+    if anim.action:
+        hasher.update(f"action:{anim.action.name}".encode())
+        _hash_fcurves(hasher, anim.action.fcurves)
+        animated.update(fc.data_path for fc in anim.action.fcurves)
+    for track in anim.nla_tracks:
+        hasher.update(f"track:{track.name}:{track.mute}:{track.is_solo}".encode())
+        _hash_nla_strips(hasher, track.strips, animated)
+    for fc in anim.drivers:
+        # Variables and their targets, not only the expression
+        _hash_rna(hasher, fc.driver)
+        animated.add(fc.data_path)
+    _hash_fcurves(hasher, anim.drivers)
+    return animated
+
+def compute_bake_fingerprint(arm_obj, frame_start, frame_end, bone_names=None):
+    """Return a digest of everything that can change the result of baking arm_obj.
+
+    bone_names limits the bake to some bones, None stands for the whole rig.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{arm_obj.name}:{frame_start}:{frame_end}".encode())
+    if bone_names is not None:
+        hasher.update(("bones:" + ",".join(sorted(bone_names))).encode())
+
+    # Source action (includes the snap influence curves), NLA and drivers, also on the armature data
+    animated = _hash_animation(hasher, arm_obj)
+    _hash_animation(hasher, arm_obj.data)
+
+    targets = {}
+    for pb in arm_obj.pose.bones:
+        bone_path = _pose_bone_path(pb.name)
+        # Unkeyed bones keep their current pose for the whole bake
+        if not any(f"{bone_path}.{prop}" in animated for prop in POSE_TRANSFORM_PROPS):
+            hasher.update(pb.name.encode())
+            _hash_matrix(hasher, pb.matrix_basis)
+
+        # Snap/tweak constraints as well as any other constraint on the bone
+        for c in pb.constraints:
+            hasher.update(f"{pb.name}:{c.name}".encode())
+            influence_path = f'{bone_path}.constraints["{bpy.utils.escape_identifier(c.name)}"].influence'
+            # Keyed influence is covered by the action, its current value depends on the frame
+            _hash_rna(hasher, c, skip={"influence"} if influence_path in animated else ())
+            target = getattr(c, "target", None)
+            if target:
+                targets[target.name] = target
+
+    # Empties (and any other target object) driving the constraints
+    for name in sorted(targets):
+        target = targets[name]
+        hasher.update(f"target:{name}".encode())
+        if not _hash_animation(hasher, target):
+            _hash_matrix(hasher, target.matrix_world)
+
+    return hasher.hexdigest()
+
 # PANEL ------------------------------------------------------------------------------
 
 class POSE_OT_bake_action(bpy.types.Operator):
@@ -677,6 +2351,12 @@ class POSE_OT_bake_action(bpy.types.Operator):
     bl_label = "Bake Action"
     bl_description = "Baking Edited Action."
     bl_options = {'REGISTER', 'UNDO'}
+
+    force: bpy.props.BoolProperty(
+        name="Force",
+        description="Bake even when nothing changed since the last bake",
+        default=False
+    )
     
     @classmethod
     def poll(cls, context):
@@ -689,6 +2369,22 @@ class POSE_OT_bake_action(bpy.types.Operator):
         # DAPATKAN NILAI FRAME DARI SCENE
         frameStart = context.scene.frame_start
         frameEnd = context.scene.frame_end
+        arm_obj = context.active_object
+
+        # Skip the evaluation when the armature is still in the state the last bake left it
+        fingerprint = compute_bake_fingerprint(arm_obj, frameStart, frameEnd)
+        baked_action = arm_obj.bonesnap_baked_action
+        current_action = arm_obj.animation_data.action if arm_obj.animation_data else None
+        if (not self.force and
+            baked_action and
+            baked_action == current_action and
+            fingerprint == arm_obj.bonesnap_bake_hash):
+            context.scene.bonesnap_bake_cache_hits += 1
+            # End in Pose Mode like a real bake does
+            bpy.ops.object.mode_set(mode='POSE')
+            self.report({'INFO'}, f"Nothing changed since last bake, reusing '{baked_action.name}'")
+            return {'FINISHED'}
+        context.scene.bonesnap_bake_cache_misses += 1
         
         self.report({'INFO'}, f"Baking from frame {frameStart} to {frameEnd}")
         
@@ -707,14 +2403,290 @@ class POSE_OT_bake_action(bpy.types.Operator):
                 use_current_action=True,
                 bake_types={'POSE'}
             )
+
+            # Remember the baked state so an unchanged re-bake can be skipped
+            arm_obj.bonesnap_baked_action = arm_obj.animation_data.action
+            arm_obj.bonesnap_bake_hash = compute_bake_fingerprint(arm_obj, frameStart, frameEnd)
             
-            self.report({'INFO'}, f"✅ Successfully baked action from frame {frame_start} to {frame_end}!")
+            self.report({'INFO'}, f"✅ Successfully baked action from frame {frameStart} to {frameEnd}!")
             return {'FINISHED'}
             
         except Exception as e:
             self.report({'ERROR'}, f"Baking failed: {str(e)}")
             return {'CANCELLED'}
 
+# GROUP OPERATIONS -------------------------------------------------------------------
+
+# Per-character timings of the last group operation, shown in the panel
+_group_timings = {}
+
+def _group_armatures(context):
+    collection = context.scene.bone_tool_group_collection
+    if not collection:
+        return []
+    return [obj for obj in collection.all_objects if obj.type == 'ARMATURE']
+
+def filter_bone_names(arm_obj, pattern_text):
+    """Return the bones of arm_obj matching any of the comma separated patterns."""
+    patterns = [p.strip().lower() for p in pattern_text.split(",") if p.strip()]
+    return [bone.name for bone in arm_obj.data.bones
+            if any(fnmatch.fnmatchcase(bone.name.lower(), p) for p in patterns)]
+
+def _group_requests(context):
+    """Return (arm_obj, bone_names) for every group armature with matching bones."""
+    pattern_text = context.scene.bone_tool_group_bone_filter
+    requests = [(arm_obj, filter_bone_names(arm_obj, pattern_text)) for arm_obj in _group_armatures(context)]
+    return [(arm_obj, names) for arm_obj, names in requests if names]
+
+def _store_group_timings(label, timings):
+    _group_timings.clear()
+    _group_timings["operation"] = label
+    _group_timings["shared_ms"] = timings.pop(None, 0.0) * 1000.0
+    _group_timings["characters"] = sorted(((name, seconds * 1000.0) for name, seconds in timings.items()),
+                                          key=lambda entry: entry[1], reverse=True)
+
+def _bake_bone_curves(action, pose_bone, frames, basis):
+    """Replace the transform curves of a bone with one key per frame."""
+    bone_path = _pose_bone_path(pose_bone.name)
+    # Curves of every rotation mode go, so no stale channel is left behind
+    for fc in list(action.fcurves):
+        if fc.data_path.startswith(bone_path + ".") and fc.data_path[len(bone_path) + 1:] in POSE_TRANSFORM_PROPS:
+            action.fcurves.remove(fc)
+    co = np.empty((len(frames), 2), dtype=np.float32)
+    co[:, 0] = frames
+    for prop, values in _basis_channels(pose_bone, basis, _BoneBakeState()).items():
+        for index in range(values.shape[1]):
+            fc = action.fcurves.new(f"{bone_path}.{prop}", index=index, action_group=pose_bone.name)
+            fc.keyframe_points.add(len(frames))
+            co[:, 1] = values[:, index]
+            fc.keyframe_points.foreach_set("co", co.ravel())
+            fc.update()
+
+class OBJECT_OT_group_prepare_snap(bpy.types.Operator):
+    """Prepare Snap for the matching bones of every armature in the group collection"""
+    bl_idname = "object.group_prepare_snap"
+    bl_label = "Group Prepare Snap"
+    bl_description = "Create snap empties and constraints for the matching bones of all armatures in the collection"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return bool(_group_armatures(context))
+
+    def execute(self, context):
+        try:
+            scene = context.scene
+            requests = _group_requests(context)
+            if not requests:
+                self.report({'WARNING'}, "No bones match the filter in the group collection.")
+                return {'CANCELLED'}
+
+            # The current frame is already evaluated, the pose on screen (unkeyed edits
+            # included) is used like the single-rig Prepare Snap does
+            timings = {}
+            plan = [(arm_obj, name, snap_empty_matrix(arm_obj.matrix_world @ arm_obj.pose.bones[name].matrix,
+                                                      scene.bone_tool_follow_rotation))
+                    for arm_obj, names in requests for name in names]
+            start = time.perf_counter()
+            empty_matrices, _ground_hits = ground_snap_matrices(context, [p[2] for p in plan])
+            timings[None] = timings.get(None, 0.0) + time.perf_counter() - start
+
+            for (arm_obj, name, _matrix), matrix in zip(plan, empty_matrices):
+                start = time.perf_counter()
+                empty = create_snap_empty(context, matrix)
+                if scene.bone_tool_add_constraints:
+                    add_snap_constraints(arm_obj.pose.bones[name], empty)
+                timings[arm_obj.name] = timings.get(arm_obj.name, 0.0) + time.perf_counter() - start
+
+            _store_group_timings("Prepare Snap", timings)
+            self.report({'INFO'}, f"Prepared {len(plan)} bones on {len(requests)} armatures.")
+            return {'FINISHED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Group prepare snap failed: {str(e)}")
+            return {'CANCELLED'}
+
+class OBJECT_OT_group_snap_influence(bpy.types.Operator):
+    """Snap or unsnap the matching bones of every armature in the group collection"""
+    bl_idname = "object.group_snap_influence"
+    bl_label = "Group Snap Influence"
+    bl_description = "Key snapLoc/snapRot influences of the matching bones on all armatures in the collection"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    mode: bpy.props.EnumProperty(
+        name="Mode",
+        items=[
+            ('SNAP', "Snap", "Blend the snap constraints in, ending at the current frame"),
+            ('UNSNAP', "Unsnap", "Blend the snap constraints out, starting at the current frame"),
+        ],
+        default='SNAP'
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return bool(_group_armatures(context)) and not context.scene.is_update_prepared
+
+    def execute(self, context):
+        try:
+            scene = context.scene
+            current_frame = scene.frame_current
+            if self.mode == 'SNAP':
+                keys = ((current_frame - scene.bone_tool_keyframe_offset, 0.0), (current_frame, 1.0))
+            else:
+                keys = ((current_frame, 1.0), (current_frame + scene.bone_tool_unsnap_offset, 0.0))
+
+            timings = {}
+            keyed = 0
+            for arm_obj, names in _group_requests(context):
+                start = time.perf_counter()
+                for name in names:
+                    # Same pick as the single-bone operators: the last snapLoc/snapRot wins
+                    snap_constraints = {}
+                    for c in arm_obj.pose.bones[name].constraints:
+                        if c.name.startswith("snapLoc:"):
+                            snap_constraints["loc"] = c
+                        elif c.name.startswith("snapRot:"):
+                            snap_constraints["rot"] = c
+                    for c in snap_constraints.values():
+                        for frame, value in keys:
+                            c.influence = value
+                            c.keyframe_insert(data_path="influence", frame=frame)
+                    keyed += bool(snap_constraints)
+                timings[arm_obj.name] = time.perf_counter() - start
+
+            if not keyed:
+                self.report({'WARNING'}, "No 'snapLoc:' or 'snapRot:' constraints found on the matching bones.")
+                return {'CANCELLED'}
+            _store_group_timings("Snap" if self.mode == 'SNAP' else "Unsnap", timings)
+            self.report({'INFO'}, f"Keyed {self.mode.lower()} influence on {keyed} bones.")
+            return {'FINISHED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Group snap influence failed: {str(e)}")
+            return {'CANCELLED'}
+
+class OBJECT_OT_group_tweak_pose(bpy.types.Operator):
+    """Tweak the matching bones of every armature in the group collection"""
+    bl_idname = "object.group_tweak_pose"
+    bl_label = "Group Tweak Pose"
+    bl_description = "Create tweak empties and Child Of constraints for the matching bones of all armatures in the collection"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return bool(_group_armatures(context))
+
+    def execute(self, context):
+        try:
+            scene = context.scene
+            requests = _group_requests(context)
+            if not requests:
+                self.report({'WARNING'}, "No bones match the filter in the group collection.")
+                return {'CANCELLED'}
+
+            # Live pose of the current frame, like the single-rig Tweak Pose
+            timings = {}
+            count = 0
+            for arm_obj, names in requests:
+                start = time.perf_counter()
+                for name in names:
+                    bone_matrix_world = arm_obj.matrix_world @ arm_obj.pose.bones[name].matrix
+                    empty_matrix = Matrix.Translation(bone_matrix_world.to_translation())
+                    new_empty = create_snap_empty(context, empty_matrix, name=f"Tweak_Empty_{name}")
+                    new_empty.empty_display_type = 'CUBE'
+                    new_empty.empty_display_size = 0.2
+
+                    child_of_constraint = arm_obj.pose.bones[name].constraints.new(type='CHILD_OF')
+                    child_of_constraint.name = f"Tweak_ChildOf_{name}"
+                    child_of_constraint.target = new_empty
+                    if scene.tweak_pose_set_inverse:
+                        child_of_constraint.inverse_matrix = empty_matrix.inverted() @ bone_matrix_world
+                    count += 1
+                timings[arm_obj.name] = timings.get(arm_obj.name, 0.0) + time.perf_counter() - start
+
+            _store_group_timings("Tweak", timings)
+            self.report({'INFO'}, f"Created {count} tweak empties on {len(requests)} armatures.")
+            return {'FINISHED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Group tweak failed: {str(e)}")
+            return {'CANCELLED'}
+
+class OBJECT_OT_group_bake(bpy.types.Operator):
+    """Bake the matching bones of every armature in the group collection"""
+    bl_idname = "object.group_bake"
+    bl_label = "Group Bake"
+    bl_description = "Visually bake the matching bones of all armatures in the collection over the scene range"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    force: bpy.props.BoolProperty(
+        name="Force",
+        description="Bake even when nothing changed since the last bake",
+        default=False
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return bool(_group_armatures(context))
+
+    def execute(self, context):
+        try:
+            scene = context.scene
+            frameStart = scene.frame_start
+            frameEnd = scene.frame_end
+
+            requests = _group_requests(context)
+            if not requests:
+                self.report({'WARNING'}, "No bones match the filter in the group collection.")
+                return {'CANCELLED'}
+
+            # Characters left untouched since their last bake are skipped
+            timings = {}
+            to_bake = []
+            skipped = 0
+            for arm_obj, names in requests:
+                start = time.perf_counter()
+                fingerprint = compute_bake_fingerprint(arm_obj, frameStart, frameEnd, names)
+                current_action = arm_obj.animation_data.action if arm_obj.animation_data else None
+                timings[arm_obj.name] = time.perf_counter() - start
+                if (not self.force and
+                    arm_obj.bonesnap_baked_action and
+                    arm_obj.bonesnap_baked_action == current_action and
+                    fingerprint == arm_obj.bonesnap_bake_hash):
+                    scene.bonesnap_bake_cache_hits += 1
+                    skipped += 1
+                    continue
+                scene.bonesnap_bake_cache_misses += 1
+                to_bake.append((arm_obj, names))
+
+            if to_bake:
+                # Keys are relative to the parents' visual pose, like Bake's visual keying
+                frames = np.arange(frameStart, frameEnd + 1, dtype=np.float64)
+                matrices = sample_rigs_matrices(context, to_bake, frames, timings, local=True)
+
+                for arm_obj, names in to_bake:
+                    start = time.perf_counter()
+                    if not arm_obj.animation_data:
+                        arm_obj.animation_data_create()
+                    if not arm_obj.animation_data.action:
+                        arm_obj.animation_data.action = bpy.data.actions.new(f"{arm_obj.name}Action")
+                    action = arm_obj.animation_data.action
+                    rig_matrices = matrices[arm_obj.name]
+                    for name in names:
+                        pose_bone = arm_obj.pose.bones[name]
+                        _bake_bone_curves(action, pose_bone, frames, rig_matrices[name])
+                        # Same as Bake's clear_constraints
+                        for c in list(pose_bone.constraints):
+                            pose_bone.constraints.remove(c)
+                    arm_obj.bonesnap_baked_action = action
+                    arm_obj.bonesnap_bake_hash = compute_bake_fingerprint(arm_obj, frameStart, frameEnd, names)
+                    timings[arm_obj.name] = timings.get(arm_obj.name, 0.0) + time.perf_counter() - start
+
+            _store_group_timings("Bake", timings)
+            self.report({'INFO'}, f"Baked {len(to_bake)} armatures from frame {frameStart} to {frameEnd}, "
+                                  f"{skipped} unchanged.")
+            return {'FINISHED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Group bake failed: {str(e)}")
+            return {'CANCELLED'}
+
 class VIEW3D_PT_bone_empty_panel(bpy.types.Panel):
     """Creates a panel in the 3D Viewport"""
     bl_label = "BoneSnap"
@@ -756,6 +2728,20 @@ class VIEW3D_PT_bone_empty_panel(bpy.types.Panel):
         # Show the toggles (always present in layout, but disabled if context is wrong and not prepared)
         row = box1.row()
         row.prop(context.scene, "bone_tool_follow_rotation", text="Follow Rotation")
+
+        # Ground contact options
+        row = box1.row(align=True)
+        row.prop(context.scene, "bone_tool_ground_snap", text="Ground")
+        sub = row.row(align=True)
+        sub.active = context.scene.bone_tool_ground_snap
+        sub.prop(context.scene, "bone_tool_ground_collection", text="")
+        if context.scene.bone_tool_ground_snap:
+            row = box1.row(align=True)
+            row.prop(context.scene, "bone_tool_ground_offset", text="Offset")
+            row.prop(context.scene, "bone_tool_ground_search", text="Search")
+            row = box1.row(align=True)
+            row.prop(context.scene, "bone_tool_ground_align_normal", text="Align to Normal")
+            row.operator("pose.ground_snap_empties", text="Snap Empties", icon='SNAP_FACE')
         
         # Main button (disabled if update is prepared)
         row = box1.row()
@@ -797,11 +2783,69 @@ class VIEW3D_PT_bone_empty_panel(bpy.types.Panel):
             c2 = col2.column(align=True)
             c2.scale_y = 1.5
             c2.operator("pose.unsnap_influence", text="Unsnap", icon='SNAP_OFF')
+
+            row = box2.row(align=True)
+            row.prop(context.scene, "bone_tool_marker_mode", text="")
+            row.operator("pose.snap_at_markers", text="Snap at Markers", icon='MARKER_HLT')
             
             coli = box3.column(align=True)
             coli.prop(context.scene, "tweak_pose_set_inverse", text="Set Inverse")
             coli.operator("pose.tweak_pose", text="Tweak", icon="POSE_HLT")
             coli.operator("pose.bake_action", text="Bake", icon="DISC")
+            row = coli.row()
+            row.label(text=f"Bake cache: {context.scene.bonesnap_bake_cache_hits} hits / "
+                           f"{context.scene.bonesnap_bake_cache_misses} misses")
+
+            cols = box3.column(align=True)
+            cols.prop(context.scene, "bone_tool_stream_window", text="Window")
+            row = cols.row(align=True)
+            row.prop(context.scene, "bone_tool_contact_height", text="Height")
+            row.prop(context.scene, "bone_tool_contact_speed", text="Speed")
+            cols.operator("pose.stream_contact_cleanup", text="Stream Cleanup", icon='MOD_TIME')
+            if context.scene.bonesnap_stream_fps > 0.0:
+                cols.label(text=f"Last cleanup: {context.scene.bonesnap_stream_fps:.0f} fps")
+
+        # Transfer works from Object Mode too, keep it outside the pose-only boxes
+        box4 = layout.box()
+        col4 = box4.column(align=True)
+        col4.prop(context.scene, "bone_tool_bone_map_preset", text="")
+        if context.scene.bone_tool_bone_map_preset == 'TEXT':
+            col4.prop(context.scene, "bone_tool_bone_map_text", text="")
+        col4.operator("object.transfer_snap_setup", text="Transfer to Selected", icon='MOD_DATA_TRANSFER')
+
+        # Group operations over every armature of a collection
+        box6 = layout.box()
+        col6 = box6.column(align=True)
+        col6.prop(context.scene, "bone_tool_group_collection", text="")
+        col6.prop(context.scene, "bone_tool_group_bone_filter", text="")
+        row = col6.row(align=True)
+        row.operator("object.group_prepare_snap", text="Prepare", icon='EMPTY_ARROWS')
+        row.operator("object.group_tweak_pose", text="Tweak", icon='POSE_HLT')
+        row = col6.row(align=True)
+        row.operator("object.group_snap_influence", text="Snap", icon='SNAP_ON').mode = 'SNAP'
+        row.operator("object.group_snap_influence", text="Unsnap", icon='SNAP_OFF').mode = 'UNSNAP'
+        row.operator("object.group_bake", text="Bake", icon='DISC')
+        if _group_timings:
+            col6 = box6.column(align=True)
+            col6.label(text=f"{_group_timings['operation']}: shared {_group_timings['shared_ms']:.1f} ms")
+            for name, ms in _group_timings["characters"]:
+                col6.label(text=f"{name}: {ms:.1f} ms", icon='ARMATURE_DATA')
+
+        # Playback profiler, worst offenders of the last run
+        box5 = layout.box()
+        row = box5.row(align=True)
+        row.prop(context.scene, "bone_tool_profile_samples", text="Samples")
+        row.operator("pose.profile_snap_cost", text="Profile", icon='TIME')
+        row.operator("pose.export_snap_profile", text="", icon='EXPORT')
+        if _profile_results:
+            col5 = box5.column(align=True)
+            col5.label(text=f"{_profile_results['armature']}: {_profile_results['as_is_ms']:.2f} ms/frame")
+            col5.label(text=f"Constraints muted: {_profile_results['constraints_muted_ms']:.2f} ms/frame")
+            col5.label(text=f"Empties hidden: {_profile_results['empties_hidden_ms']:.2f} ms/frame")
+            for entry in _profile_results["bones"][:3]:
+                col5.label(text=f"{entry['bone']}: {entry['ms']:.2f} ms", icon='BONE_DATA')
+            for entry in _profile_results["constraints"][:5]:
+                col5.label(text=f"{entry['constraint']}: {entry['ms']:.2f} ms", icon='CONSTRAINT_BONE')
 
 
 # Registration
@@ -812,6 +2856,17 @@ classes = (
     POSE_OT_update_empty,
     POSE_OT_continue_update_empty,
     POSE_OT_tweak_pose,
+    POSE_OT_ground_snap_empties,
+    POSE_OT_snap_at_markers,
+    OBJECT_OT_transfer_snap_setup,
+    POSE_OT_check_fk_evaluator,
+    POSE_OT_stream_contact_cleanup,
+    POSE_OT_profile_snap_cost,
+    POSE_OT_export_snap_profile,
+    OBJECT_OT_group_prepare_snap,
+    OBJECT_OT_group_snap_influence,
+    OBJECT_OT_group_tweak_pose,
+    OBJECT_OT_group_bake,
     VIEW3D_PT_bone_empty_panel,
     POSE_OT_bake_action,
 )
@@ -819,9 +2874,16 @@ classes = (
 def register():
     for cls in classes:
         bpy.utils.register_class(cls)
+    bpy.app.handlers.depsgraph_update_post.append(_invalidate_ground_bvh)
+    bpy.app.handlers.load_post.append(_clear_ground_bvh)
 
 
 def unregister():
+    if _invalidate_ground_bvh in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(_invalidate_ground_bvh)
+    if _clear_ground_bvh in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_clear_ground_bvh)
+    _ground_bvh_cache.clear()
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
     # Unregister the scene properties
@@ -832,6 +2894,25 @@ def unregister():
     del bpy.types.Scene.tweak_pose_set_inverse
     del bpy.types.Scene.is_update_prepared
     del bpy.types.Scene.temp_target_empty_name
+    del bpy.types.Scene.bone_tool_ground_snap
+    del bpy.types.Scene.bone_tool_ground_collection
+    del bpy.types.Scene.bone_tool_ground_offset
+    del bpy.types.Scene.bone_tool_ground_search
+    del bpy.types.Scene.bone_tool_ground_align_normal
+    del bpy.types.Scene.bone_tool_marker_mode
+    del bpy.types.Scene.bone_tool_bone_map_preset
+    del bpy.types.Scene.bone_tool_bone_map_text
+    del bpy.types.Scene.bone_tool_stream_window
+    del bpy.types.Scene.bone_tool_contact_height
+    del bpy.types.Scene.bone_tool_contact_speed
+    del bpy.types.Scene.bonesnap_stream_fps
+    del bpy.types.Scene.bone_tool_profile_samples
+    del bpy.types.Scene.bone_tool_group_collection
+    del bpy.types.Scene.bone_tool_group_bone_filter
+    del bpy.types.Object.bonesnap_bake_hash
+    del bpy.types.Object.bonesnap_baked_action
+    del bpy.types.Scene.bonesnap_bake_cache_hits
+    del bpy.types.Scene.bonesnap_bake_cache_misses
 
 if __name__ == "__main__":
     register()
\ No newline at end of file